@@ -1,7 +1,134 @@
+import copy
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+import numpy as np
 from agno import tools
 from ..services.rdkit_utils import RDKitUtils
 from ..services.admet_ai_client import ADMETClient
 
+# ADMET property table shared by the admet-ai formatter and the stub fallback.
+# Stub values are stored column-wise so a batch of molecules is a single (n, 8)
+# array sliced into dicts at the API boundary.
+_PROP_NAMES = (
+    "solubility", "permeability", "bioavailability", "clearance",
+    "half_life", "toxicity", "herg_inhibition", "cyp3a4_inhibition",
+)
+_PROP_UNITS = (
+    "log(mol/L)", "log(cm/s)", "probability", "mL/min/kg",
+    "hours", "probability", "probability", "probability",
+)
+_PROP_DESCS = (
+    "Aqueous solubility", "Membrane permeability", "Oral bioavailability", "Hepatic clearance",
+    "Elimination half-life", "General toxicity risk", "hERG channel inhibition", "CYP3A4 enzyme inhibition",
+)
+# Read-only property name -> (unit, description) lookup for formatting model output
+_ADMET_META = MappingProxyType(dict(zip(_PROP_NAMES, zip(_PROP_UNITS, _PROP_DESCS))))
+_PROP_DEFAULT_VALUES = np.array([-2.5, -5.2, 0.75, 15.3, 8.2, 0.25, 0.15, 0.30], dtype=np.float64)
+_PROP_CONF = np.array([0.82, 0.78, 0.90, 0.75, 0.80, 0.85, 0.88, 0.77], dtype=np.float64)
+
+def _stub_batch(n: int) -> np.ndarray:
+    """Return an (n, 8) read-only view of the stub values, one row per molecule."""
+    return np.broadcast_to(_PROP_DEFAULT_VALUES, (n, len(_PROP_NAMES)))
+
+def _stub_predictions(values: np.ndarray) -> list:
+    """Package one row of stub values as prediction dicts."""
+    return [
+        {"property": name, "value": value, "unit": unit, "description": desc, "confidence": conf}
+        for name, unit, desc, value, conf in zip(
+            _PROP_NAMES, _PROP_UNITS, _PROP_DESCS, values.tolist(), _PROP_CONF.tolist()
+        )
+    ]
+
+# Conformer and ADMET results are cached on the canonical SMILES so that different
+# writings of the same molecule collapse to a single computation (descriptor
+# summaries are memoized in RDKitUtils). Standard InChIKeys are not used as the
+# key because they merge tautomers, which have different conformers and ADMET
+# profiles. Cached dicts are deep-copied on the way out.
+
+@lru_cache(maxsize=4096)
+def _conformer_cached(canonical_smiles: str, forcefield: str) -> dict:
+    pdb_block = RDKitUtils.embed_conformer(canonical_smiles, forcefield)
+    
+    # Count atoms for validation; RDKit writes END as the final record, so only the tail needs checking
+    atom_count = pdb_block.count("HETATM")
+    
+    return {
+        "pdb_block": pdb_block,
+        "status": "success",
+        "forcefield_used": forcefield,
+        "atom_count": atom_count,
+        "has_3d_coords": atom_count > 0 and "END" in pdb_block[-16:]
+    }
+
+@lru_cache(maxsize=4096)
+def _admet_cached(canonical_smiles: str) -> dict:
+    # Use the shared ADMET-AI model if available
+    model = ADMETClient.load()
+    if model is not None:
+        # Predict ADMET properties
+        predictions = model.predict(canonical_smiles)
+        
+        # Format predictions into standardized structure
+        formatted_predictions = []
+        for prop_name, value in predictions.items():
+            if prop_name in _ADMET_META:
+                unit, desc = _ADMET_META[prop_name]
+                formatted_predictions.append({
+                    "property": prop_name,
+                    "value": float(value) if isinstance(value, (int, float)) else value,
+                    "unit": unit,
+                    "description": desc,
+                    "confidence": 0.85
+                })
+        
+        return {
+            "predictions": formatted_predictions,
+            "status": "success",
+            "model_info": "ADMET-AI prediction model",
+            "smiles": canonical_smiles
+        }
+    
+    # Fallback to realistic stub predictions
+    return {
+        "predictions": _stub_predictions(_stub_batch(1)[0]),
+        "status": "success",
+        "model_info": "ADMET stub predictions (admet-ai not available)",
+        "smiles": canonical_smiles
+    }
+
+def _analysis_id(canonical_smiles: str) -> str:
+    """Stable analysis ID: identical across processes and restarts, unlike the salted built-in hash()."""
+    digest = hashlib.blake2b(canonical_smiles.encode(), digest_size=8).hexdigest()
+    return f"analysis_{digest}"
+
+def _molecular_block(molecular_data: dict) -> dict:
+    return {
+        "formula": molecular_data.get("formula", ""),
+        "molecular_weight": molecular_data.get("weight", 0),
+        "inchi": molecular_data.get("inchi", ""),
+        "inchikey": molecular_data.get("inchikey", ""),
+        "descriptors": molecular_data.get("descriptors", {}),
+        "status": "success"
+    }
+
+def _structure_block(conformer_data: dict) -> dict:
+    return {
+        "pdb_block": conformer_data.get("pdb_block", ""),
+        "forcefield": conformer_data.get("forcefield_used", "UFF"),
+        "atom_count": conformer_data.get("atom_count", 0),
+        "has_coordinates": conformer_data.get("has_3d_coords", False),
+        "status": "success"
+    }
+
+def _admet_block(admet_data: dict) -> dict:
+    return {
+        "predictions": admet_data.get("predictions", []),
+        "model_info": admet_data.get("model_info", "Unknown model"),
+        "status": "success"
+    }
+
 @tools.tool
 def rdkit_sanitize(smiles: str) -> dict:
     """
@@ -56,18 +183,8 @@ def rdkit_conformer(smiles: str, forcefield: str = "UFF") -> dict:
             return {"error": f"Invalid force field '{forcefield}'. Must be one of: {valid_forcefields}"}
         
         # Generate conformer
-        pdb_block = RDKitUtils.embed_conformer(smiles, forcefield_upper)
-        
-        # Count atoms for validation
-        atom_count = pdb_block.count("HETATM")
-        
-        return {
-            "pdb_block": pdb_block,
-            "status": "success",
-            "forcefield_used": forcefield_upper,
-            "atom_count": atom_count,
-            "has_3d_coords": "HETATM" in pdb_block and "END" in pdb_block
-        }
+        canonical_smiles = RDKitUtils.sanitize_smiles(smiles)
+        return copy.deepcopy(_conformer_cached(canonical_smiles, forcefield_upper))
     except Exception as e:
         return {"error": f"Failed to generate conformer: {str(e)}", "status": "failed"}
 
@@ -86,64 +203,11 @@ def admet_predict(smiles: str) -> dict:
         if not smiles or not isinstance(smiles, str):
             return {"error": "Invalid input: SMILES must be a non-empty string"}
         
-        # Try to use admet-ai if available
-        try:
-            from admet_ai import ADMETModel
-            
-            # Initialize ADMET model
-            model = ADMETModel()
-            
-            # Predict ADMET properties
-            predictions = model.predict(smiles)
-            
-            # Format predictions into standardized structure
-            formatted_predictions = []
-            property_mapping = {
-                'solubility': {'unit': 'log(mol/L)', 'description': 'Aqueous solubility'},
-                'permeability': {'unit': 'log(cm/s)', 'description': 'Membrane permeability'},
-                'bioavailability': {'unit': 'probability', 'description': 'Oral bioavailability'},
-                'clearance': {'unit': 'mL/min/kg', 'description': 'Hepatic clearance'},
-                'half_life': {'unit': 'hours', 'description': 'Elimination half-life'},
-                'toxicity': {'unit': 'probability', 'description': 'General toxicity risk'},
-                'herg_inhibition': {'unit': 'probability', 'description': 'hERG channel inhibition'},
-                'cyp3a4_inhibition': {'unit': 'probability', 'description': 'CYP3A4 enzyme inhibition'}
-            }
-            
-            for prop_name, value in predictions.items():
-                if prop_name in property_mapping:
-                    formatted_predictions.append({
-                        "property": prop_name,
-                        "value": float(value) if isinstance(value, (int, float)) else value,
-                        "unit": property_mapping[prop_name]['unit'],
-                        "description": property_mapping[prop_name]['description'],
-                        "confidence": 0.85
-                    })
-            
-            return {
-                "predictions": formatted_predictions,
-                "status": "success",
-                "model_info": "ADMET-AI prediction model",
-                "smiles": smiles
-            }
-            
-        except ImportError:
-            # Fallback to realistic stub predictions
-            return {
-                "predictions": [
-                    {"property": "solubility", "value": -2.5, "unit": "log(mol/L)", "description": "Aqueous solubility", "confidence": 0.82},
-                    {"property": "permeability", "value": -5.2, "unit": "log(cm/s)", "description": "Membrane permeability", "confidence": 0.78},
-                    {"property": "bioavailability", "value": 0.75, "unit": "probability", "description": "Oral bioavailability", "confidence": 0.90},
-                    {"property": "clearance", "value": 15.3, "unit": "mL/min/kg", "description": "Hepatic clearance", "confidence": 0.75},
-                    {"property": "half_life", "value": 8.2, "unit": "hours", "description": "Elimination half-life", "confidence": 0.80},
-                    {"property": "toxicity", "value": 0.25, "unit": "probability", "description": "General toxicity risk", "confidence": 0.85},
-                    {"property": "herg_inhibition", "value": 0.15, "unit": "probability", "description": "hERG channel inhibition", "confidence": 0.88},
-                    {"property": "cyp3a4_inhibition", "value": 0.30, "unit": "probability", "description": "CYP3A4 enzyme inhibition", "confidence": 0.77}
-                ],
-                "status": "success",
-                "model_info": "ADMET stub predictions (admet-ai not available)",
-                "smiles": smiles
-            }
-        
+        canonical_smiles = RDKitUtils.sanitize_smiles(smiles)
+        result = copy.deepcopy(_admet_cached(canonical_smiles))
+        result["smiles"] = smiles
+        return result
+    
     except Exception as e:
         return {"error": f"Failed to predict ADMET properties: {str(e)}", "status": "failed"}
 
@@ -163,8 +227,8 @@ def render_payload(molecular_data: dict, conformer_data: dict, admet_data: dict)
     try:
         # Initialize the structured payload
         payload = {
-            "analysis_id": f"analysis_{hash(str(molecular_data.get('smiles', '')))}"[:16],
-            "timestamp": __import__('datetime').datetime.now().isoformat(),
+            "analysis_id": _analysis_id(molecular_data.get("smiles", "")),
+            "timestamp": datetime.now().isoformat(),
             "status": "success",
             "smiles": molecular_data.get("smiles", ""),
             "molecular_properties": {},
@@ -173,77 +237,36 @@ def render_payload(molecular_data: dict, conformer_data: dict, admet_data: dict)
             "summary": {}
         }
         
-        # Process molecular properties
-        if molecular_data and not molecular_data.get("error"):
-            payload["molecular_properties"] = {
-                "formula": molecular_data.get("formula", ""),
-                "molecular_weight": molecular_data.get("weight", 0),
-                "inchi": molecular_data.get("inchi", ""),
-                "inchikey": molecular_data.get("inchikey", ""),
-                "descriptors": molecular_data.get("descriptors", {}),
-                "status": "success"
-            }
-        else:
-            payload["molecular_properties"] = {
-                "status": "failed",
-                "error": molecular_data.get("error", "Unknown error in molecular analysis")
-            }
-        
-        # Process 3D structure data
-        if conformer_data and conformer_data.get("pdb_block") and not conformer_data.get("error"):
-            payload["structure_3d"] = {
-                "pdb_block": conformer_data.get("pdb_block", ""),
-                "forcefield": conformer_data.get("forcefield_used", "UFF"),
-                "atom_count": conformer_data.get("atom_count", 0),
-                "has_coordinates": conformer_data.get("has_3d_coords", False),
-                "status": "success"
-            }
-        else:
-            payload["structure_3d"] = {
-                "status": "failed",
-                "error": conformer_data.get("error", "Unknown error in 3D structure generation")
-            }
-        
-        # Process ADMET predictions
-        if admet_data and admet_data.get("predictions") and not admet_data.get("error"):
-            payload["admet_predictions"] = {
-                "predictions": admet_data.get("predictions", []),
-                "model_info": admet_data.get("model_info", "Unknown model"),
-                "status": "success"
-            }
-        else:
-            payload["admet_predictions"] = {
-                "status": "failed",
-                "error": admet_data.get("error", "Unknown error in ADMET predictions")
-            }
-        
-        # Generate summary
+        # Build each section and classify it as successful/failed in a single pass
+        sections = (
+            ("molecular_properties", molecular_data, None, _molecular_block, "Unknown error in molecular analysis"),
+            ("structure_3d", conformer_data, "pdb_block", _structure_block, "Unknown error in 3D structure generation"),
+            ("admet_predictions", admet_data, "predictions", _admet_block, "Unknown error in ADMET predictions"),
+        )
         successful_analyses = []
         failed_analyses = []
         
-        if payload["molecular_properties"]["status"] == "success":
-            successful_analyses.append("molecular_properties")
-        else:
-            failed_analyses.append("molecular_properties")
-            
-        if payload["structure_3d"]["status"] == "success":
-            successful_analyses.append("structure_3d")
-        else:
-            failed_analyses.append("structure_3d")
-            
-        if payload["admet_predictions"]["status"] == "success":
-            successful_analyses.append("admet_predictions")
-        else:
-            failed_analyses.append("admet_predictions")
+        for name, data, required_key, build, default_error in sections:
+            if data and not data.get("error") and (required_key is None or data.get(required_key)):
+                payload[name] = build(data)
+                successful_analyses.append(name)
+            else:
+                payload[name] = {
+                    "status": "failed",
+                    "error": data.get("error", default_error)
+                }
+                failed_analyses.append(name)
         
+        # Generate summary
+        n_success = len(successful_analyses)
         payload["summary"] = {
             "total_analyses": 3,
-            "successful_analyses": len(successful_analyses),
+            "successful_analyses": n_success,
             "failed_analyses": len(failed_analyses),
-            "success_rate": len(successful_analyses) / 3,
+            "success_rate": n_success / 3,
             "successful_components": successful_analyses,
             "failed_components": failed_analyses,
-            "overall_status": "success" if len(successful_analyses) >= 2 else "partial" if len(successful_analyses) >= 1 else "failed"
+            "overall_status": "success" if n_success >= 2 else "partial" if n_success >= 1 else "failed"
         }
         
         return payload
@@ -252,5 +275,5 @@ def render_payload(molecular_data: dict, conformer_data: dict, admet_data: dict)
         return {
             "status": "failed",
             "error": f"Failed to render payload: {str(e)}",
-            "timestamp": __import__('datetime').datetime.now().isoformat()
-        } 
\ No newline at end of file
+            "timestamp": datetime.now().isoformat()
+        }
@@ -1,10 +1,27 @@
 import os
-from pydantic import BaseModel
+from dataclasses import dataclass
+from functools import lru_cache
 
-class Settings(BaseModel):
-  ENV: str = os.getenv("ENV", "dev")
-  AGNO_TELEMETRY: str = os.getenv("AGNO_TELEMETRY", "false")
-  OPENAI_API_KEY: str | None = os.getenv("OPENAI_API_KEY")
-  GROQ_API_KEY: str | None = os.getenv("GROQ_API_KEY")
+@dataclass(frozen=True, slots=True)
+class Settings:
+  ENV: str = "dev"
+  AGNO_TELEMETRY: bool = False
+  OPENAI_API_KEY: str | None = None
+  GROQ_API_KEY: str | None = None
+  RDKIT_PROCESSES: int = 1
+  CACHE_DIR: str = ""  # disk cache is off unless MAS_CACHE_DIR names a private directory
 
-settings = Settings() 
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+  """Read the environment once and return the cached Settings."""
+  return Settings(
+    ENV=os.getenv("ENV", "dev"),
+    AGNO_TELEMETRY=os.getenv("AGNO_TELEMETRY", "false").lower() in ("1", "true", "yes"),
+    OPENAI_API_KEY=os.getenv("OPENAI_API_KEY"),
+    GROQ_API_KEY=os.getenv("GROQ_API_KEY"),
+    # Batch process pool size per server worker: split the cores between gunicorn's WEB_CONCURRENCY workers
+    RDKIT_PROCESSES=int(os.getenv("MAS_RDKIT_PROCESSES", 0)) or max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", 1))),
+    CACHE_DIR=os.getenv("MAS_CACHE_DIR", ""),
+  )
+
+settings = get_settings()
\ No newline at end of file
@@ -1,18 +1,38 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes.molecules import router as molecules_router
+from fastapi.middleware.gzip import GZipMiddleware
+from .responses import ORJSONResponse
+from .routes.molecules import router as molecules_router, admet_batcher
+from .config import settings
+from .services.admet_ai_client import ADMETClient
+from .services.executors import make_rdkit_process_pool
 
-app = FastAPI(title="Agno ADMET API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the ADMET-AI model once per process instead of on the first request
+    ADMETClient.load()
+    app.state.rdkit_process_pool = make_rdkit_process_pool(settings.RDKIT_PROCESSES)
+    try:
+        yield
+    finally:
+        await admet_batcher.close()
+        app.state.rdkit_process_pool.shutdown(cancel_futures=True)
+
+app = FastAPI(title="Agno ADMET API", version="0.1.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+# PDB blocks and descriptor tables are highly compressible ASCII
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
 
 @app.get("/")
 def root():
-    return {"message": "Agno ADMET API is running.", "endpoints": ["/api/health", "/api/parse", "/api/conformer", "/api/admet", "/api/analyze"]}
+    return {"message": "Agno ADMET API is running.", "endpoints": ["/api/health", "/api/parse", "/api/parse/batch", "/api/conformer", "/api/conformer/pdb", "/api/admet", "/api/admet/batch", "/api/analyze", "/api/batch_analyze"]}
 
 app.include_router(molecules_router) 
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Union
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict, Literal, Union
 
 class ParseRequest(BaseModel):
     smiles: Optional[str] = None
@@ -13,9 +13,19 @@ class MoleculeSummary(BaseModel):
     inchikey: str = ""
     descriptors: Dict[str, float] = {}
 
+class ParseBatchRequest(BaseModel):
+    smiles: List[str]
+
 class ConformerRequest(BaseModel):
     smiles: str
-    forcefield: str = Field(default="UFF")
+    forcefield: Literal["UFF", "MMFF"] = Field(default="UFF")
+    num_confs: int = Field(default=1, ge=1, le=50)
+
+    @field_validator("forcefield", mode="before")
+    @classmethod
+    def normalize_forcefield(cls, value):
+        # Accept any case; the normalized name feeds ETags and cache keys
+        return value.upper() if isinstance(value, str) else value
 
 class ConformerResponse(BaseModel):
     pdb_block: str
@@ -33,5 +43,16 @@ class AdmetPrediction(BaseModel):
 class AdmetResponse(BaseModel):
     predictions: List[AdmetPrediction]
 
+class AdmetBatchRequest(BaseModel):
+    smiles: List[str]
+
+class AdmetBatchResult(BaseModel):
+    smiles: str
+    predictions: List[AdmetPrediction] = []
+    error: Optional[str] = None
+
+class AdmetBatchResponse(BaseModel):
+    results: List[AdmetBatchResult]
+
 class AnalyzeRequest(BaseModel):
     smiles: str 
\ No newline at end of file
@@ -1,17 +1,56 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import hashlib
+from functools import partial
+import rdkit
+from fastapi import APIRouter, HTTPException, Request, Response
+from ..responses import ORJSONResponse
 from ..models.schemas import (
-    ParseRequest, MoleculeSummary, ConformerRequest, ConformerResponse,
-    AdmetRequest, AdmetResponse, AnalyzeRequest, AdmetPrediction
+    ParseRequest, ParseBatchRequest, MoleculeSummary, ConformerRequest, ConformerResponse,
+    AdmetRequest, AdmetResponse, AnalyzeRequest, AdmetPrediction,
+    AdmetBatchRequest, AdmetBatchResponse
 )
 from ..services.rdkit_utils import RDKitUtils
-from ..services.admet_ai_client import ADMETClient
+from ..services.admet_ai_client import ADMETClient, ADMETBatcher
+from ..services.executors import RDKIT_POOL, ADMET_POOL
+from ..config import settings
 from ..agents.parser_agent import parser_agent
 from ..agents.conformer_agent import conformer_agent
 from ..agents.admet_agent import admet_agent
-from ..agents.render_agent import render_agent
+from ..agents.toolkit import rdkit_sanitize, rdkit_conformer, admet_predict, render_payload
 
 router = APIRouter(prefix="/api", tags=["molecules"])
 
+# Coalesces concurrent /api/admet requests into batched model calls
+admet_batcher = ADMETBatcher()
+
+# Bump when the shape or content of the parse/conformer/admet responses changes
+ETAG_VERSION = "v2"
+
+# Results also depend on the RDKit build and on which ADMET predictor is loaded
+_ETAG_SALT = f"{ETAG_VERSION}|rdkit-{rdkit.__version__}|{ADMETClient.identity()}"
+
+def _etag(canonical_smiles: str, endpoint: str) -> str:
+    """Weak ETag for a deterministic per-molecule result.
+    
+    Keyed on the canonical SMILES rather than the InChIKey, which merges tautomers. Weak because
+    GZipMiddleware serves the identity and gzip encodings of the same body under one tag.
+    """
+    digest = hashlib.blake2b(f"{canonical_smiles}|{_ETAG_SALT}".encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}-{endpoint}"'
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already covers `etag` (weak comparison)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in tags or "*" in tags
+
+def _batch_summary(request: Request, smiles_list):
+    """batch_summary bound to the app's process pool (absent when the app runs without its lifespan)."""
+    executor = getattr(request.app.state, "rdkit_process_pool", None)
+    return partial(RDKitUtils.batch_summary, smiles_list, workers=settings.RDKIT_PROCESSES, executor=executor)
+
 @router.get("/health")
 def health():
     return {
@@ -26,123 +65,273 @@ def health():
         "endpoints": [
             "/api/health",
             "/api/parse", 
+            "/api/parse/batch",
             "/api/conformer",
+            "/api/conformer/pdb",
             "/api/admet",
+            "/api/admet/batch",
             "/api/analyze",
+            "/api/batch_analyze",
             "/api/render"
         ]
     }
 
-@router.post("/parse", response_model=MoleculeSummary)
-def parse(req: ParseRequest):
-    """Parse and validate a SMILES string using the ParserAgent or fallback to direct RDKit."""
+@router.post("/parse", responses={200: {"model": MoleculeSummary}})
+async def parse(req: ParseRequest, request: Request, response: Response, explain: bool = False):
+    """Parse and validate a SMILES string with RDKit, or via the ParserAgent when `explain=true`."""
     if not req.smiles:
         raise HTTPException(400, "SMILES required")
     
-    try:
-        # Try ParserAgent first
-        result = parser_agent.run(req.smiles)
-        
-        if "error" in result:
-            raise Exception(result["error"])
-        
-        return MoleculeSummary(
-            smiles=result["smiles"],
-            formula=result["formula"],
-            weight=result["weight"],
-            inchi=result["inchi"],
-            inchikey=result["inchikey"],
-            descriptors=result["descriptors"]
-        )
-    except Exception as agent_error:
-        # Fallback to direct RDKit operations
+    if explain:
         try:
-            sanitized_smiles = RDKitUtils.sanitize_smiles(req.smiles)
-            meta = RDKitUtils.mol_summary(sanitized_smiles)
+            result = await parser_agent.arun(req.smiles)
+            
+            if "error" in result:
+                raise Exception(result["error"])
             
             return MoleculeSummary(
-                smiles=sanitized_smiles,
-                formula=meta["formula"],
-                weight=meta["weight"],
-                inchi=meta["inchi"],
-                inchikey=meta["inchikey"],
-                descriptors=meta["descriptors"]
+                smiles=result["smiles"],
+                formula=result["formula"],
+                weight=result["weight"],
+                inchi=result["inchi"],
+                inchikey=result["inchikey"],
+                descriptors=result["descriptors"]
             )
-        except Exception as rdkit_error:
-            raise HTTPException(400, f"Failed to parse SMILES (Agent: {str(agent_error)}, RDKit: {str(rdkit_error)})")
-
-@router.post("/conformer", response_model=ConformerResponse)
-def conformer(req: ConformerRequest):
-    """Generate 3D conformer using the ConformerAgent or fallback to direct RDKit."""
+        except Exception:
+            # Fall through to direct RDKit operations
+            pass
+    
+    loop = asyncio.get_running_loop()
     try:
-        # Try ConformerAgent first
-        result = conformer_agent.run(f"Generate 3D conformer for SMILES: {req.smiles} using {req.forcefield} force field")
+        sanitized_smiles = await loop.run_in_executor(RDKIT_POOL, RDKitUtils.sanitize_smiles, req.smiles)
+        etag = _etag(sanitized_smiles, "parse")
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        if "error" in result:
-            raise Exception(result["error"])
+        meta = await loop.run_in_executor(RDKIT_POOL, RDKitUtils.mol_summary, sanitized_smiles)
         
-        return ConformerResponse(
-            pdb_block=result.get("pdb_block", ""),
-            status=result.get("status", "ok")
-        )
-    except Exception as agent_error:
-        # Fallback to direct RDKit operations
+        # RDKit output is trusted, so return it as-is rather than re-validating through MoleculeSummary
+        response.headers["ETag"] = etag
+        return {
+            "smiles": sanitized_smiles,
+            "formula": meta["formula"],
+            "weight": meta["weight"],
+            "inchi": meta["inchi"],
+            "inchikey": meta["inchikey"],
+            "descriptors": meta["descriptors"]
+        }
+    except Exception as rdkit_error:
+        raise HTTPException(400, f"Failed to parse SMILES: {str(rdkit_error)}")
+
+@router.post("/parse/batch")
+async def parse_batch(req: ParseBatchRequest, request: Request):
+    """Parse a list of SMILES with RDKit across worker processes; invalid entries carry an `error` field."""
+    if not req.smiles:
+        raise HTTPException(400, "SMILES list required")
+    
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(
+        RDKIT_POOL, _batch_summary(request, req.smiles)
+    )
+    return {"results": results}
+
+@router.post("/conformer", responses={200: {"model": ConformerResponse}})
+async def conformer(req: ConformerRequest, request: Request, response: Response, explain: bool = False):
+    """Generate 3D conformer with RDKit, or via the ConformerAgent when `explain=true`."""
+    if explain:
         try:
-            pdb = RDKitUtils.embed_conformer(req.smiles, req.forcefield)
-            return ConformerResponse(pdb_block=pdb, status="ok")
-        except Exception as rdkit_error:
-            raise HTTPException(400, f"Failed to generate conformer (Agent: {str(agent_error)}, RDKit: {str(rdkit_error)})")
-
-@router.post("/admet", response_model=AdmetResponse)
-def admet(req: AdmetRequest):
-    """Predict ADMET properties using the ADMETAgent or fallback to direct ADMET-AI."""
+            result = await conformer_agent.arun(f"Generate 3D conformer for SMILES: {req.smiles} using {req.forcefield} force field")
+            
+            if "error" in result:
+                raise Exception(result["error"])
+            
+            return ConformerResponse(
+                pdb_block=result.get("pdb_block", ""),
+                status=result.get("status", "ok")
+            )
+        except Exception:
+            # Fall through to direct RDKit operations
+            pass
+    
+    loop = asyncio.get_running_loop()
     try:
-        # Try ADMETAgent first
-        result = admet_agent.run(f"Predict ADMET properties for SMILES: {req.smiles}")
+        canonical_smiles = await loop.run_in_executor(RDKIT_POOL, RDKitUtils.sanitize_smiles, req.smiles)
+        etag = _etag(canonical_smiles, f"conformer-{req.forcefield}-{req.num_confs}")
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        if "error" in result:
-            raise Exception(result["error"])
+        pdb = await loop.run_in_executor(RDKIT_POOL, RDKitUtils.embed_conformer, canonical_smiles, req.forcefield, req.num_confs)
+        response.headers["ETag"] = etag
+        return {"pdb_block": pdb, "status": "ok"}
+    except Exception as rdkit_error:
+        raise HTTPException(400, f"Failed to generate conformer: {str(rdkit_error)}")
+
+@router.post("/conformer/pdb", response_class=Response)
+async def conformer_pdb(req: ConformerRequest, request: Request):
+    """Generate a 3D conformer with RDKit and return the bare PDB block as chemical/x-pdb."""
+    loop = asyncio.get_running_loop()
+    try:
+        canonical_smiles = await loop.run_in_executor(RDKIT_POOL, RDKitUtils.sanitize_smiles, req.smiles)
+        etag = _etag(canonical_smiles, f"conformer-pdb-{req.forcefield}-{req.num_confs}")
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        # Convert predictions to the expected format
-        predictions = []
-        for pred in result.get("predictions", []):
-            predictions.append(AdmetPrediction(
-                property=pred["property"],
-                value=pred["value"],
-                probability=pred.get("confidence", 0.0)
-            ))
+        pdb = await loop.run_in_executor(RDKIT_POOL, RDKitUtils.embed_conformer, canonical_smiles, req.forcefield, req.num_confs)
+    except Exception as rdkit_error:
+        raise HTTPException(400, f"Failed to generate conformer: {str(rdkit_error)}")
+    
+    # No JSON envelope: newlines go out unescaped and GZipMiddleware compresses the text
+    return Response(pdb, media_type="chemical/x-pdb", headers={"ETag": etag})
+
+@router.post("/admet", responses={200: {"model": AdmetResponse}})
+async def admet(req: AdmetRequest, request: Request, response: Response, explain: bool = False):
+    """Predict ADMET properties with ADMET-AI, or via the ADMETAgent when `explain=true`."""
+    if explain:
+        try:
+            result = await admet_agent.arun(f"Predict ADMET properties for SMILES: {req.smiles}")
+            
+            if "error" in result:
+                raise Exception(result["error"])
+            
+            # Convert predictions to the expected format
+            predictions = []
+            for pred in result.get("predictions", []):
+                predictions.append(AdmetPrediction(
+                    property=pred["property"],
+                    value=pred["value"],
+                    probability=pred.get("confidence", 0.0)
+                ))
+            
+            return AdmetResponse(predictions=predictions)
+        except Exception:
+            # Fall through to direct ADMET-AI operations
+            pass
+    
+    loop = asyncio.get_running_loop()
+    try:
+        canonical_smiles = await loop.run_in_executor(RDKIT_POOL, RDKitUtils.sanitize_smiles, req.smiles)
+        etag = _etag(canonical_smiles, "admet")
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        return AdmetResponse(predictions=predictions)
-    except Exception as agent_error:
-        # Fallback to direct ADMET-AI operations
+        preds = await admet_batcher.predict(canonical_smiles)
+        response.headers["ETag"] = etag
+        return {"predictions": preds}
+    except Exception as admet_error:
+        raise HTTPException(400, f"Failed to predict ADMET properties: {str(admet_error)}")
+
+def _sanitize_each(smiles_list):
+    """(canonical SMILES, None) or (None, error) for every entry, so one bad SMILES does not fail a batch."""
+    sanitized = []
+    for smiles in smiles_list:
+        try:
+            sanitized.append((RDKitUtils.sanitize_smiles(smiles), None))
+        except ValueError as e:
+            sanitized.append((None, str(e)))
+    return sanitized
+
+@router.post("/admet/batch", responses={200: {"model": AdmetBatchResponse}})
+async def admet_batch(req: AdmetBatchRequest):
+    """Predict ADMET properties for a list of SMILES with a single ADMET-AI call.
+    
+    Entries are canonicalized first; invalid ones get an `error` and are kept out of the model call.
+    """
+    if not req.smiles:
+        raise HTTPException(400, "SMILES list required")
+    
+    loop = asyncio.get_running_loop()
+    sanitized = await loop.run_in_executor(RDKIT_POOL, _sanitize_each, req.smiles)
+    results = [
+        {"smiles": canonical} if error is None else {"smiles": smiles, "error": error}
+        for smiles, (canonical, error) in zip(req.smiles, sanitized)
+    ]
+    
+    valid = [result for result in results if "error" not in result]
+    if valid:
+        try:
+            batch = await loop.run_in_executor(ADMET_POOL, ADMETClient.predict_many, [r["smiles"] for r in valid])
+            if len(batch) != len(valid):
+                raise RuntimeError(f"ADMET model returned {len(batch)} results for {len(valid)} SMILES")
+        except Exception as admet_error:
+            raise HTTPException(400, f"Failed to predict ADMET properties: {str(admet_error)}")
+        for result, predictions in zip(valid, batch):
+            result["predictions"] = predictions
+    
+    return {"results": results}
+
+@router.post("/batch_analyze")
+async def batch_analyze(req: ParseBatchRequest, request: Request):
+    """Molecular summaries and ADMET predictions for a list of SMILES in one request.
+    
+    RDKit work fans out over the persistent process pool; valid molecules then share a single
+    ADMET-AI call. Conformers are left to /api/conformer. Invalid entries carry an `error` field.
+    """
+    if not req.smiles:
+        raise HTTPException(400, "SMILES list required")
+    
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(
+        RDKIT_POOL, _batch_summary(request, req.smiles)
+    )
+    
+    valid = [result for result in results if "error" not in result]
+    if valid:
         try:
-            preds = ADMETClient.predict(req.smiles)
-            out = [AdmetPrediction(**p) for p in preds]
-            return AdmetResponse(predictions=out)
+            batch = await loop.run_in_executor(ADMET_POOL, ADMETClient.predict_many, [r["smiles"] for r in valid])
+            if len(batch) != len(valid):
+                raise RuntimeError(f"ADMET model returned {len(batch)} results for {len(valid)} SMILES")
         except Exception as admet_error:
-            raise HTTPException(400, f"Failed to predict ADMET properties (Agent: {str(agent_error)}, ADMET-AI: {str(admet_error)})")
+            for result in valid:
+                result["admet_error"] = f"ADMET prediction failed: {str(admet_error)}"
+        else:
+            for result, predictions in zip(valid, batch):
+                result["admet"] = predictions
+    
+    return {"results": results}
 
 @router.post("/analyze")
-def analyze(req: AnalyzeRequest):
-    """Comprehensive molecular analysis using all four agents: Parser, Conformer, ADMET, and Render."""
+async def analyze(req: AnalyzeRequest, explain: bool = False):
+    """Comprehensive molecular analysis: parse, conformer and ADMET tools (or their agents when `explain=true`), then render."""
+    loop = asyncio.get_running_loop()
     try:
-        # Step 1: Parse molecule using ParserAgent
-        molecular_result = parser_agent.run(req.smiles)
-        
-        # Step 2: Generate 3D conformer using ConformerAgent
-        conformer_result = conformer_agent.run(f"Generate 3D conformer for SMILES: {req.smiles} using UFF force field")
+        # Parse the input once up front and hand every stage the canonical SMILES
+        canonical_smiles = await loop.run_in_executor(RDKIT_POOL, RDKitUtils.sanitize_smiles, req.smiles)
+    except ValueError as e:
+        raise HTTPException(400, f"Complete analysis failed: {str(e)}")
+    
+    try:
+        # Steps 1-3: parsing, conformer generation and ADMET only depend on the input SMILES, so run them concurrently
+        if explain:
+            stages = (
+                parser_agent.arun(canonical_smiles),
+                conformer_agent.arun(f"Generate 3D conformer for SMILES: {canonical_smiles} using UFF force field"),
+                admet_agent.arun(f"Predict ADMET properties for SMILES: {canonical_smiles}"),
+            )
+        else:
+            # Call the deterministic tools directly; no prompt building or LLM inference
+            stages = (
+                loop.run_in_executor(RDKIT_POOL, rdkit_sanitize.entrypoint, canonical_smiles),
+                loop.run_in_executor(RDKIT_POOL, rdkit_conformer.entrypoint, canonical_smiles, "UFF"),
+                loop.run_in_executor(ADMET_POOL, admet_predict.entrypoint, canonical_smiles),
+            )
         
-        # Step 3: Predict ADMET properties using ADMETAgent
-        admet_result = admet_agent.run(f"Predict ADMET properties for SMILES: {req.smiles}")
+        molecular_result, conformer_result, admet_result = await asyncio.gather(*stages, return_exceptions=True)
+        if isinstance(molecular_result, Exception):
+            molecular_result = {"error": f"Parser failed: {str(molecular_result)}"}
+        if isinstance(conformer_result, Exception):
+            conformer_result = {"error": f"Conformer failed: {str(conformer_result)}"}
+        if isinstance(admet_result, Exception):
+            admet_result = {"error": f"ADMET failed: {str(admet_result)}"}
         
-        # Step 4: Format payload using RenderAgent
-        render_result = render_agent.run(f"Format analysis results for molecular_data: {molecular_result}, conformer_data: {conformer_result}, admet_data: {admet_result}")
+        # Step 4: Format payload directly with the deterministic render tool (no LLM round-trip)
+        render_result = render_payload.entrypoint(molecular_result, conformer_result, admet_result)
         
-        # If render agent worked, return the structured payload
+        # If rendering worked, encode the structured payload straight to JSON bytes
+        # (returning a Response skips FastAPI's jsonable_encoder walk of the PDB/descriptor tree)
         if render_result and not render_result.get("error"):
-            return render_result
+            return ORJSONResponse(render_result)
         
-        # Fallback: return basic structure if render agent fails
+        # Fallback: return basic structure if rendering fails
         return {
             "molecule": molecular_result if not molecular_result.get("error") else {
                 "smiles": req.smiles,
@@ -168,13 +357,10 @@ def analyze(req: AnalyzeRequest):
 
 @router.post("/render")
 def render_analysis(molecular_data: dict, conformer_data: dict, admet_data: dict):
-    """Format analysis results using the RenderAgent."""
-    try:
-        result = render_agent.run(f"Format analysis results for molecular_data: {molecular_data}, conformer_data: {conformer_data}, admet_data: {admet_data}")
-        
-        if "error" in result:
-            raise HTTPException(400, result["error"])
-        
-        return result
-    except Exception as e:
-        raise HTTPException(400, f"Failed to render analysis: {str(e)}") 
\ No newline at end of file
+    """Format analysis results with the render_payload tool."""
+    result = render_payload.entrypoint(molecular_data, conformer_data, admet_data)
+    
+    if "error" in result:
+        raise HTTPException(400, f"Failed to render analysis: {result['error']}")
+    
+    return ORJSONResponse(result) 
\ No newline at end of file
@@ -1,4 +1,8 @@
-from typing import List, Dict, Any
+import asyncio
+import threading
+from importlib.metadata import PackageNotFoundError, version
+from typing import List, Dict, Any, Optional, Tuple
+from .executors import ADMET_POOL
 
 try:
     from admet_ai import ADMETModel
@@ -7,20 +11,121 @@ except Exception:
 
 class ADMETClient:
     _model = None
+    _lock = threading.Lock()
 
     @classmethod
     def load(cls):
         if ADMETModel and cls._model is None:
-            cls._model = ADMETModel()
+            with cls._lock:
+                if cls._model is None:
+                    cls._model = ADMETModel()
         return cls._model
 
+    @classmethod
+    def identity(cls) -> str:
+        """Which predictor answers: the admet-ai model with its version, or the stub."""
+        if ADMETModel is None:
+            return "stub"
+        try:
+            return f"admet-ai-{version('admet_ai')}"
+        except PackageNotFoundError:
+            return "admet-ai"
+
     @classmethod
     def predict(cls, smiles: str) -> List[Dict[str, Any]]:
+        return cls.predict_many([smiles])[0]
+
+    @classmethod
+    def predict_many(cls, smiles_list: List[str]) -> List[List[Dict[str, Any]]]:
+        """Predict ADMET properties for several SMILES with a single model call."""
         if ADMETModel is None:
             return [
-                {"property": "HIA", "value": 0.82, "probability": 0.82},
-                {"property": "hERG", "value": "low-risk", "probability": 0.73},
+                [
+                    {"property": "HIA", "value": 0.82, "probability": 0.82},
+                    {"property": "hERG", "value": "low-risk", "probability": 0.73},
+                ]
+                for _ in smiles_list
             ]
         model = cls.load()
-        preds = model.predict([smiles])  # pandas.DataFrame
-        return preds.to_dict(orient="records") 
\ No newline at end of file
+        preds = model.predict(smiles_list)  # pandas.DataFrame, one row per SMILES
+        return [[record] for record in preds.to_dict(orient="records")]
+
+
+class ADMETBatcher:
+    """Coalesce concurrent single-SMILES predictions into one `predict_many` call.
+
+    Requests are collected until either `max_batch` SMILES are queued or
+    `max_wait` seconds have passed since the first one arrived.
+    """
+
+    def __init__(self, max_batch: int = 32, max_wait: float = 0.02):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def predict(self, smiles: str) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+
+        future = loop.create_future()
+        await self._queue.put((smiles, future))
+        return await future
+
+    async def close(self):
+        """Stop the worker task and fail every request still waiting on it."""
+        worker, queue, loop = self._worker, self._queue, self._loop
+        self._worker = self._queue = self._loop = None
+        # A worker left behind by an earlier event loop cannot be cancelled from this one
+        if worker is None or loop is not asyncio.get_running_loop():
+            return
+
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+        while not queue.empty():
+            _, future = queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("ADMET batcher closed"))
+
+    async def _run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        batch: List[Tuple[str, asyncio.Future]] = []
+        try:
+            while True:
+                batch = [await queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                try:
+                    results = await loop.run_in_executor(ADMET_POOL, ADMETClient.predict_many, [smiles for smiles, _ in batch])
+                    # Results are matched to requests by position; a short result list would leave callers waiting forever
+                    if len(results) != len(batch):
+                        raise RuntimeError(f"ADMET model returned {len(results)} results for {len(batch)} SMILES")
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for (_, future), result in zip(batch, results):
+                        if not future.done():
+                            future.set_result(result)
+        except asyncio.CancelledError:
+            # close(): the batch being collected or predicted would otherwise never resolve
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("ADMET batcher closed"))
+            raise
@@ -0,0 +1,21 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# RDKit work (embedding, force-field optimisation, descriptors) is CPU-bound C++,
+# while ADMET-AI inference spends most of its time in torch with the GIL released.
+# Giving each its own pool stops a slow conformer from queueing ADMET requests behind it.
+RDKIT_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="rdkit")
+# Embedding and force-field optimisation can fan out into their own RDKit threads. The pool already
+# runs one call per core, so each call gets its share of the cores (1 with the default pool size)
+# rather than numThreads=0, which would start a thread per core in every call: cores² in total.
+RDKIT_THREADS_PER_CALL = max(1, (os.cpu_count() or 1) // RDKIT_POOL._max_workers)
+ADMET_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="admet")
+
+def make_rdkit_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Process pool for the batch endpoints, since most RDKit descriptor calls hold the GIL.
+    
+    Created once by the app lifespan (and shut down with it) so a batch does not pay for worker
+    start-up. Workers are spawned rather than forked because the thread pools above may be mid-call.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
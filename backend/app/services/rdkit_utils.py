@@ -1,131 +1,320 @@
+import copy
+import multiprocessing
+import os
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from ..config import settings
+from .executors import RDKIT_THREADS_PER_CALL
+
+# Import RDKit once at process start instead of inside every call
+try:
+    import rdkit
+    from rdkit import Chem
+    from rdkit.Chem import AllChem, Crippen, Descriptors, Lipinski, inchi, rdMolDescriptors
+    _RDKIT_AVAILABLE = True
+except ImportError:
+    _RDKIT_AVAILABLE = False
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+def _open_disk_cache():
+    """Persistent cache shared by worker processes and restarts; None unless diskcache is installed and MAS_CACHE_DIR is set.
+    
+    diskcache stores pickles, so MAS_CACHE_DIR must be a directory only this service's user can write.
+    """
+    if diskcache is None or not settings.CACHE_DIR:
+        return None
+    return diskcache.Cache(settings.CACHE_DIR, size_limit=2**30)
+
+_DISK_CACHE = _open_disk_cache()
+
+# Part of every disk-cache key: bump the schema when summary/PDB output changes, and entries
+# written by another RDKit release are never served
+_DISK_CACHE_VERSION = f"v1-rdkit{rdkit.__version__}" if _RDKIT_AVAILABLE else None
+
+# Parsing is cached on the raw input string and returns the canonical SMILES,
+# which downstream caches use as their key. Invalid input is cached as None so
+# repeated bad requests do not re-run the parser; callers raise on None.
+
+@lru_cache(maxsize=4096)
+def _canonical(smiles: str) -> Optional[str]:
+    if not _RDKIT_AVAILABLE:
+        raise RuntimeError("RDKit is not installed")
+    # MolFromSmiles sanitizes by default and returns None when sanitization fails
+    mol = Chem.MolFromSmiles(smiles.strip())
+    if mol is None:
+        return None
+    
+    return Chem.MolToSmiles(mol)
+
+@lru_cache(maxsize=4096)
+def _mol_from_canonical(canonical_smiles: str) -> "Chem.Mol":
+    return Chem.MolFromSmiles(canonical_smiles)
+
+def _mol(smiles: str) -> "Chem.Mol":
+    """Return a private copy of the cached Mol for `smiles`, raising ValueError if invalid."""
+    canonical_smiles = _canonical(smiles) if smiles and smiles.strip() else None
+    if canonical_smiles is None:
+        raise ValueError(f"Invalid SMILES: {smiles}")
+    # Descriptor calculators cache computed properties on the Mol, so never share it between threads
+    return Chem.Mol(_mol_from_canonical(canonical_smiles))
+
+@lru_cache(maxsize=4096)
+def _mol_identity(canonical_smiles: str) -> Tuple[str, str]:
+    """(InChI, InChIKey) for a canonical SMILES, generated once per molecule."""
+    try:
+        inchi_str = inchi.MolToInchi(_mol(canonical_smiles))
+        return inchi_str, inchi.InchiToInchiKey(inchi_str)
+    except Exception:
+        # InChI not available in some RDKit builds
+        return "", ""
+
+def _optional_descriptor(*candidates) -> Optional[Callable]:
+    """Resolve the first available (module, name) descriptor, or None if none exist in this RDKit build."""
+    for module, name in candidates:
+        func = getattr(module, name, None)
+        if func is not None:
+            return func
+    return None
+
+def _build_descriptor_funcs() -> Tuple[Tuple[str, Optional[Callable]], ...]:
+    """Output key -> RDKit callable (None if unavailable), resolved once so feature detection is not repeated per molecule."""
+    return (
+        # Basic molecular properties
+        ("heavy_atom_count", Chem.Mol.GetNumHeavyAtoms),
+        ("atom_count", Chem.Mol.GetNumAtoms),
+        ("bond_count", Chem.Mol.GetNumBonds),
+        ("ring_count", rdMolDescriptors.CalcNumRings),
+        ("aromatic_ring_count", rdMolDescriptors.CalcNumAromaticRings),
+        
+        # Lipinski Rule of Five descriptors
+        ("logp", Crippen.MolLogP),
+        ("hbd", Lipinski.NumHDonors),  # Hydrogen bond donors
+        ("hba", Lipinski.NumHAcceptors),  # Hydrogen bond acceptors
+        ("rotatable_bonds", rdMolDescriptors.CalcNumRotatableBonds),
+        
+        # Additional drug-like properties
+        ("tpsa", rdMolDescriptors.CalcTPSA),  # Topological polar surface area
+        ("formal_charge", Chem.rdmolops.GetFormalCharge),
+        ("molar_refractivity", Crippen.MolMR),
+        
+        # Optional descriptors that may not be available in all RDKit versions
+        ("fraction_sp3", _optional_descriptor((rdMolDescriptors, "CalcFractionCSP3"), (rdMolDescriptors, "CalcFractionCsp3"))),
+        ("bertz_ct", _optional_descriptor((Descriptors, "BertzCT"))),
+        ("balaban_j", _optional_descriptor((Descriptors, "BalabanJ"))),
+        ("slogp", _optional_descriptor((Descriptors, "SlogP_VSA0"))),
+    )
+
+def _compile_descriptors(table: Tuple[Tuple[str, Optional[Callable]], ...]) -> Callable:
+    """Generate a straight-line function that builds the descriptor dict in one literal.
+    
+    Unavailable descriptors are baked in as 0.0, so nothing is looked up or checked per molecule.
+    """
+    namespace = {}
+    items = []
+    for i, (key, func) in enumerate(table):
+        if func is None:
+            items.append(f"        {key!r}: 0.0,")
+        else:
+            namespace[f"_d{i}"] = func
+            items.append(f"        {key!r}: _d{i}(mol),")
+    source = "def _descriptors(mol):\n    return {\n" + "\n".join(items) + "\n    }\n"
+    exec(source, namespace)
+    return namespace["_descriptors"]
+
+_DESCRIPTOR_FUNCS = _build_descriptor_funcs() if _RDKIT_AVAILABLE else ()
+_descriptors = _compile_descriptors(_DESCRIPTOR_FUNCS)
+
+@lru_cache(maxsize=2048)
+def _mol_summary_cached(canonical_smiles: str) -> dict:
+    if _DISK_CACHE is not None:
+        key = ("summary", _DISK_CACHE_VERSION, canonical_smiles)
+        cached = _DISK_CACHE.get(key)
+        if cached is not None:
+            return cached
+        summary = _compute_mol_summary(canonical_smiles)
+        _DISK_CACHE.set(key, summary)
+        return summary
+    return _compute_mol_summary(canonical_smiles)
+
+def _compute_mol_summary(canonical_smiles: str) -> dict:
+    mol = _mol(canonical_smiles)
+    
+    # Basic properties
+    formula = rdMolDescriptors.CalcMolFormula(mol)
+    mw = Descriptors.MolWt(mol)
+    
+    # InChI and InChI Key
+    inchi_str, inchikey = _mol_identity(canonical_smiles)
+    
+    # Calculate comprehensive descriptors with the generated function
+    descriptors = _descriptors(mol)
+    
+    return _finalize_summary(formula, mw, inchi_str, inchikey, descriptors)
+
+def _lipinski_violations(mw, logp, hbd, hba):
+    """Number of Rule of Five limits exceeded; works elementwise on NumPy arrays as well as scalars."""
+    # sum() starts from int 0, so boolean arrays are counted rather than OR-ed together
+    return sum((mw > 500, logp > 5, hbd > 5, hba > 10))
+
+def _finalize_summary(formula: str, mw: float, inchi_str: str, inchikey: str, descriptors: dict) -> dict:
+    """Add the Lipinski violations count and pack the summary dict."""
+    descriptors["lipinski_violations"] = _lipinski_violations(
+        mw, descriptors["logp"], descriptors["hbd"], descriptors["hba"]
+    )
+    return {
+        "formula": formula, 
+        "weight": round(mw, 2), 
+        "inchi": inchi_str, 
+        "inchikey": inchikey,
+        "descriptors": descriptors
+    }
+
+def _build_etkdg_params() -> "AllChem.EmbedParameters":
+    """Shared ETKDGv3 parameters; built once and only read by the embedder."""
+    params = AllChem.ETKDGv3()
+    params.randomSeed = 0xf00d  # reproducible conformers (and stable ETags)
+    params.useSmallRingTorsions = True
+    params.useRandomCoords = True  # better first-attempt success on macrocycles and fused rings
+    params.numThreads = RDKIT_THREADS_PER_CALL  # calls already run side by side in RDKIT_POOL
+    return params
+
+_ETKDG_PARAMS = _build_etkdg_params() if _RDKIT_AVAILABLE else None
+
+# Below this size a process pool costs more to start than it saves
+_MIN_PARALLEL_BATCH = 32
+
+def _summary_worker(smiles: str) -> dict:
+    """Pool worker: summary for one SMILES, or an error entry so one bad input does not fail the batch."""
+    try:
+        canonical_smiles = RDKitUtils.sanitize_smiles(smiles)
+        return {"smiles": canonical_smiles, **RDKitUtils.mol_summary(canonical_smiles)}
+    except ValueError as e:
+        return {"smiles": smiles, "error": str(e)}
+
+def _column_worker(smiles: str) -> dict:
+    """Pool worker for batch_mol_summary: the summary row plus the unrounded weight for the Lipinski screen."""
+    row = _summary_worker(smiles)
+    if "error" not in row:
+        row["exact_weight"] = Descriptors.MolWt(_mol(row["smiles"]))
+    return row
+
+def _map_batch(worker: Callable[[str], dict], smiles_list: List[str], workers: Optional[int],
+               executor: Optional[Executor]) -> List[Dict]:
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(smiles_list) < _MIN_PARALLEL_BATCH:
+        return [worker(smiles) for smiles in smiles_list]
+    
+    if executor is not None:
+        return list(executor.map(worker, smiles_list, chunksize=16))
+    
+    # spawn rather than fork: the API process runs thread pools that must not be forked mid-call
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        return pool.map(worker, smiles_list, chunksize=32)
+
 class RDKitUtils:
     @staticmethod
     def sanitize_smiles(smiles: str) -> str:
         """Sanitize and canonicalize a SMILES string."""
-        from rdkit import Chem
         if not smiles or not smiles.strip():
             raise ValueError("Empty SMILES string provided")
         
-        mol = Chem.MolFromSmiles(smiles.strip())
-        if mol is None:
+        canonical_smiles = _canonical(smiles)
+        if canonical_smiles is None:
             raise ValueError(f"Invalid SMILES: {smiles}")
         
-        try:
-            Chem.SanitizeMol(mol)
-        except Exception as e:
-            raise ValueError(f"Failed to sanitize molecule: {str(e)}")
-        
-        return Chem.MolToSmiles(mol)
+        return canonical_smiles
 
     @staticmethod
     def mol_summary(smiles: str) -> dict:
         """Get comprehensive molecular summary including descriptors."""
-        from rdkit import Chem
-        from rdkit.Chem import Descriptors, rdMolDescriptors, Crippen, Lipinski
-        
-        mol = Chem.MolFromSmiles(smiles)
-        if mol is None:
-            raise ValueError(f"Invalid SMILES: {smiles}")
-        
-        # Basic properties
-        formula = rdMolDescriptors.CalcMolFormula(mol)
-        mw = Descriptors.MolWt(mol)
-        
-        # InChI and InChI Key
-        inchi_str = ""
-        inchikey = ""
-        try:
-            from rdkit.Chem import inchi
-            inchi_str = inchi.MolToInchi(mol)
-            inchikey = inchi.InchiToInchiKey(inchi_str)
-        except Exception:
-            # InChI not available in some RDKit builds
-            pass
-        
-        # Calculate comprehensive descriptors with compatibility checks
-        descriptors = {
-            # Basic molecular properties
-            "heavy_atom_count": mol.GetNumHeavyAtoms(),
-            "atom_count": mol.GetNumAtoms(),
-            "bond_count": mol.GetNumBonds(),
-            "ring_count": rdMolDescriptors.CalcNumRings(mol),
-            "aromatic_ring_count": rdMolDescriptors.CalcNumAromaticRings(mol),
-            
-            # Lipinski Rule of Five descriptors
-            "logp": Crippen.MolLogP(mol),
-            "hbd": Lipinski.NumHDonors(mol),  # Hydrogen bond donors
-            "hba": Lipinski.NumHAcceptors(mol),  # Hydrogen bond acceptors
-            "rotatable_bonds": rdMolDescriptors.CalcNumRotatableBonds(mol),
-            
-            # Additional drug-like properties
-            "tpsa": rdMolDescriptors.CalcTPSA(mol),  # Topological polar surface area
-            "formal_charge": Chem.rdmolops.GetFormalCharge(mol),
-            "molar_refractivity": Crippen.MolMR(mol),
-        }
+        # Deep-copy so callers cannot mutate the cached summary
+        return copy.deepcopy(_mol_summary_cached(RDKitUtils.sanitize_smiles(smiles)))
+
+    @staticmethod
+    def embed_conformer(smiles: str, forcefield: str = "UFF", num_confs: int = 1) -> str:
+        """Generate 3D conformer(s) and return the lowest-energy one as a PDB block."""
+        if _DISK_CACHE is None:
+            return RDKitUtils._embed_conformer(smiles, forcefield, num_confs)
         
-        # Add optional descriptors that may not be available in all RDKit versions
-        try:
-            descriptors["fraction_sp3"] = rdMolDescriptors.CalcFractionCsp3(mol)
-        except AttributeError:
-            descriptors["fraction_sp3"] = 0.0  # Default value if not available
+        # Embedding is seeded, so the block for a given molecule and settings never changes
+        key = ("pdb", _DISK_CACHE_VERSION, RDKitUtils.sanitize_smiles(smiles), forcefield.upper(), num_confs)
+        pdb_block = _DISK_CACHE.get(key)
+        if pdb_block is None:
+            pdb_block = RDKitUtils._embed_conformer(smiles, forcefield, num_confs)
+            _DISK_CACHE.set(key, pdb_block)
+        return pdb_block
+
+    @staticmethod
+    def _embed_conformer(smiles: str, forcefield: str, num_confs: int) -> str:
+        mol = Chem.AddHs(_mol(smiles))
         
-        try:
-            descriptors["bertz_ct"] = rdMolDescriptors.BertzCT(mol)
-        except (AttributeError, ValueError):
-            descriptors["bertz_ct"] = 0.0
-            
-        try:
-            descriptors["balaban_j"] = rdMolDescriptors.BalabanJ(mol)
-        except (AttributeError, ValueError):
-            descriptors["balaban_j"] = 0.0
+        # Embed molecule with the shared ETKDGv3 parameters
+        conf_ids = list(AllChem.EmbedMultipleConfs(mol, numConfs=num_confs, params=_ETKDG_PARAMS))
+        if not conf_ids:
+            raise ValueError("Failed to generate 3D conformer")
         
-        # Additional descriptor with compatibility check
-        try:
-            descriptors["slogp"] = Descriptors.SlogP_VSA0(mol) if hasattr(Descriptors, 'SlogP_VSA0') else 0.0
-        except (AttributeError, ValueError):
-            descriptors["slogp"] = 0.0
+        # Optimize all conformers with specified force field; results are (not_converged, energy) per conformer
+        if forcefield.upper() == "MMFF" and AllChem.MMFFHasAllMoleculeParams(mol):
+            results = AllChem.MMFFOptimizeMoleculeConfs(mol, numThreads=RDKIT_THREADS_PER_CALL)
+        else:
+            # UFF requested, or fallback to UFF if MMFF parameters not available
+            results = AllChem.UFFOptimizeMoleculeConfs(mol, numThreads=RDKIT_THREADS_PER_CALL)
         
-        # Add Lipinski violations count
-        violations = 0
-        if mw > 500: violations += 1
-        if descriptors["logp"] > 5: violations += 1
-        if descriptors["hbd"] > 5: violations += 1
-        if descriptors["hba"] > 10: violations += 1
-        descriptors["lipinski_violations"] = violations
+        best = min(range(len(results)), key=lambda i: results[i][1])
+        return Chem.MolToPDBBlock(mol, confId=conf_ids[best])
+
+    @staticmethod
+    def lipinski_screen(mw, logp, hbd, hba) -> np.ndarray:
+        """Rule of Five violation counts for whole descriptor columns in one vectorized pass.
         
-        return {
-            "formula": formula, 
-            "weight": round(mw, 2), 
-            "inchi": inchi_str, 
-            "inchikey": inchikey,
-            "descriptors": descriptors
-        }
+        Columns are compared as float64, so NaN rows (invalid SMILES) count as 0.
+        """
+        columns = (np.asarray(column, dtype=np.float64) for column in (mw, logp, hbd, hba))
+        return _lipinski_violations(*columns).astype(np.int8)
 
     @staticmethod
-    def embed_conformer(smiles: str, forcefield: str = "UFF") -> str:
-        """Generate 3D conformer and return as PDB block."""
-        from rdkit import Chem
-        from rdkit.Chem import AllChem
+    def batch_summary(smiles_list: List[str], workers: Optional[int] = None,
+                      executor: Optional[Executor] = None) -> List[Dict]:
+        """Molecular summaries for many SMILES, spread across processes (RDKit holds the GIL in most calls).
         
-        base = Chem.MolFromSmiles(smiles)
-        if base is None:
-            raise ValueError(f"Invalid SMILES: {smiles}")
+        Pass a long-lived `executor` to reuse its workers; otherwise a pool is started for this call.
+        """
+        return _map_batch(_summary_worker, smiles_list, workers, executor)
+
+    @staticmethod
+    def batch_mol_summary(smiles_list: List[str], workers: Optional[int] = None) -> Dict[str, object]:
+        """Column-oriented batch summary: one NumPy array per descriptor, ready for pandas/scikit-learn.
         
-        mol = Chem.AddHs(base)
+        The weight column is unrounded, so its Lipinski screen matches the per-molecule count exactly.
+        """
+        rows = _map_batch(_column_worker, smiles_list, workers, None)
+        n = len(rows)
+        float_keys = ["weight"] + [key for key, _ in _DESCRIPTOR_FUNCS]
         
-        # Embed molecule with ETKDG algorithm
-        result = AllChem.EmbedMolecule(mol, AllChem.ETKDG())
-        if result != 0:
-            raise ValueError("Failed to generate 3D conformer")
+        # Invalid SMILES keep NaN descriptors and are flagged in `valid`
+        columns = {key: np.full(n, np.nan) for key in float_keys}
+        smiles = np.empty(n, dtype=object)
+        formulas = np.empty(n, dtype=object)
+        valid = np.zeros(n, dtype=bool)
         
-        # Optimize with specified force field
-        if forcefield.upper() == "MMFF":
-            if AllChem.MMFFHasAllMoleculeParams(mol):
-                AllChem.MMFFOptimizeMolecule(mol)
-            else:
-                # Fallback to UFF if MMFF parameters not available
-                AllChem.UFFOptimizeMolecule(mol)
-        else:
-            AllChem.UFFOptimizeMolecule(mol)
+        for i, row in enumerate(rows):
+            smiles[i] = row["smiles"]
+            if "error" in row:
+                continue
+            valid[i] = True
+            formulas[i] = row["formula"]
+            columns["weight"][i] = row["exact_weight"]
+            descriptors = row["descriptors"]
+            for key in float_keys[1:]:
+                columns[key][i] = descriptors[key]
         
-        return Chem.MolToPDBBlock(mol) 
\ No newline at end of file
+        columns["lipinski_violations"] = RDKitUtils.lipinski_screen(
+            columns["weight"], columns["logp"], columns["hbd"], columns["hba"]
+        )
+        return {"smiles": smiles, "formula": formulas, "valid": valid, "descriptors": columns}
\ No newline at end of file
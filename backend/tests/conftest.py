@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+# Keep tests off any persistent disk cache: results must be computed, not read back from earlier runs
+os.environ["MAS_CACHE_DIR"] = ""
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _rdkit_warmup():
+    """Pay RDKit's import and first-embed cost once per test process (or xdist worker)."""
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+    import app.services.rdkit_utils  # builds the descriptor table and ETKDG parameters
+
+    mol = Chem.AddHs(Chem.MolFromSmiles("C"))
+    AllChem.EmbedMolecule(mol, randomSeed=0xf00d)
+    AllChem.UFFOptimizeMolecule(mol)
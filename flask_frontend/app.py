@@ -1,76 +1,176 @@
-from flask import Flask, render_template, request, jsonify
-import requests
+from quart import Quart, Response, render_template, request, jsonify
+from starlette.middleware.gzip import GZipMiddleware
+import httpx
 import json
+from types import MappingProxyType
 
-app = Flask(__name__)
+app = Quart(__name__)
 app.config['SECRET_KEY'] = 'molecular-analytics-2024'
 
+# Gzip descriptor JSON and PDB blocks on the way to the browser
+app.asgi_app = GZipMiddleware(app.asgi_app, minimum_size=512, compresslevel=6)
+
 # Backend API configuration
 BACKEND_URL = "http://localhost:8000"
 
+# One pooled async client so proxy calls share keep-alive connections to the backend
+# without tying up a worker thread while they wait
+CLIENT = httpx.AsyncClient(
+    base_url=BACKEND_URL,
+    timeout=30,
+    # Compress once, for the browser (GZipMiddleware above), not again over loopback
+    headers={'Accept-Encoding': 'identity'},
+    # Limits go on the transport: the client ignores its own `limits=` when a transport is passed
+    transport=httpx.AsyncHTTPTransport(
+        retries=2,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+    ),
+)
+
+# Example molecules for /examples, built once and read-only since every request shares them
+_EXAMPLES = tuple(MappingProxyType(example) for example in [
+    {"name": "Aspirin", "smiles": "CC(=O)OC1=CC=CC=C1C(=O)O", "description": "Pain reliever and anti-inflammatory"},
+    {"name": "Caffeine", "smiles": "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "description": "Central nervous system stimulant"},
+    {"name": "Ibuprofen", "smiles": "CC(C)CC1=CC=C(C=C1)C(C)C(=O)O", "description": "Nonsteroidal anti-inflammatory drug"},
+    {"name": "Ethanol", "smiles": "CCO", "description": "Simple alcohol, commonly used solvent"},
+    {"name": "Benzene", "smiles": "c1ccccc1", "description": "Aromatic hydrocarbon, basic benzene ring"},
+    {"name": "Glucose", "smiles": "C([C@@H]1[C@H]([C@@H]([C@H]([C@H](O1)O)O)O)O)O", "description": "Simple sugar, primary energy source"},
+    {"name": "Paracetamol", "smiles": "CC(=O)NC1=CC=C(C=C1)O", "description": "Acetaminophen, pain reliever"},
+    {"name": "Morphine", "smiles": "CN1CC[C@]23C4=C5C=CC(O)=C4O[C@H]2[C@@H](O)C=C[C@H]3[C@H]1C5", "description": "Opioid pain medication"}
+])
+
+def _revalidation_headers() -> dict:
+    """Forward the browser's If-None-Match so the backend can answer 304 Not Modified.
+    
+    Only for the backend routes that send an ETag: parse, conformer and conformer/pdb.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    return {'If-None-Match': if_none_match} if if_none_match else {}
+
+def _relayed_headers(response: httpx.Response) -> dict:
+    """Backend headers the browser needs to revalidate later"""
+    etag = response.headers.get('ETag')
+    return {'ETag': etag} if etag else {}
+
+def _relay(response: httpx.Response) -> Response:
+    """Pass the backend's response body through unchanged instead of decoding and re-encoding the JSON"""
+    if response.status_code == 304:
+        return Response(b"", status=304, headers=_relayed_headers(response))
+    return Response(
+        response.content,
+        status=response.status_code,
+        content_type=response.headers.get('Content-Type', 'application/json'),
+        headers=_relayed_headers(response),
+    )
+
+@app.after_serving
+async def close_backend_client():
+    await CLIENT.aclose()
+
 @app.route('/')
-def index():
+async def index():
     """Main page for molecular analysis"""
-    return render_template('index.html')
+    return await render_template('index.html')
 
 @app.route('/api/parse', methods=['POST'])
-def parse_molecule():
+async def parse_molecule():
     """Proxy to backend parser agent"""
     try:
-        data = request.get_json()
-        response = requests.post(f"{BACKEND_URL}/api/parse", json=data, timeout=30)
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
+        data = await request.get_json()
+        response = await CLIENT.post("/api/parse", json=data, headers=_revalidation_headers())
+        return _relay(response)
+    except httpx.HTTPError as e:
+        return jsonify({"error": f"Backend connection failed: {str(e)}"}), 500
+
+@app.route('/api/batch_parse', methods=['POST'])
+async def batch_parse_molecules():
+    """Proxy to backend batch parser (expects {"smiles": [...]})"""
+    try:
+        data = await request.get_json()
+        response = await CLIENT.post("/api/parse/batch", json=data, timeout=120)
+        return _relay(response)
+    except httpx.HTTPError as e:
+        return jsonify({"error": f"Backend connection failed: {str(e)}"}), 500
+
+@app.route('/api/batch_analyze', methods=['POST'])
+async def batch_analyze_molecules():
+    """Proxy to backend batch analysis (expects {"smiles": [...]})"""
+    try:
+        data = await request.get_json()
+        response = await CLIENT.post("/api/batch_analyze", json=data, timeout=120)
+        return _relay(response)
+    except httpx.HTTPError as e:
         return jsonify({"error": f"Backend connection failed: {str(e)}"}), 500
 
 @app.route('/api/conformer', methods=['POST'])
-def generate_conformer():
+async def generate_conformer():
     """Proxy to backend conformer agent"""
     try:
-        data = request.get_json()
-        response = requests.post(f"{BACKEND_URL}/api/conformer", json=data, timeout=30)
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
+        data = await request.get_json()
+        response = await CLIENT.post("/api/conformer", json=data, headers=_revalidation_headers())
+        return _relay(response)
+    except httpx.HTTPError as e:
         return jsonify({"error": f"Backend connection failed: {str(e)}"}), 500
 
+@app.route('/api/conformer/pdb', methods=['POST'])
+async def stream_conformer_pdb():
+    """Proxy to backend conformer route, streaming the raw PDB text through"""
+    try:
+        data = await request.get_json()
+        backend_request = CLIENT.build_request(
+            "POST", "/api/conformer/pdb", json=data, headers=_revalidation_headers()
+        )
+        response = await CLIENT.send(backend_request, stream=True)
+    except httpx.HTTPError as e:
+        return jsonify({"error": f"Backend connection failed: {str(e)}"}), 500
+
+    if response.status_code == 304:
+        await response.aclose()
+        return Response(b"", status=304, headers=_relayed_headers(response))
+
+    async def relay():
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    return Response(
+        relay(),
+        status=response.status_code,
+        content_type=response.headers.get('Content-Type', 'chemical/x-pdb'),
+        headers=_relayed_headers(response),
+    )
+
 @app.route('/api/analyze', methods=['POST'])
-def analyze_molecule():
+async def analyze_molecule():
     """Proxy to backend full analysis"""
     try:
-        data = request.get_json()
-        response = requests.post(f"{BACKEND_URL}/api/analyze", json=data, timeout=30)
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
+        data = await request.get_json()
+        response = await CLIENT.post("/api/analyze", json=data)
+        return _relay(response)
+    except httpx.HTTPError as e:
         return jsonify({"error": f"Backend connection failed: {str(e)}"}), 500
 
 @app.route('/api/health')
-def health_check():
+async def health_check():
     """Check backend health"""
     try:
-        response = requests.get(f"{BACKEND_URL}/api/health", timeout=10)
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
+        response = await CLIENT.get("/api/health", timeout=10)
+        return _relay(response)
+    except httpx.HTTPError as e:
         return jsonify({"error": f"Backend unavailable: {str(e)}"}), 503
 
 @app.route('/examples')
-def examples():
+async def examples():
     """Examples page with common molecules"""
-    examples = [
-        {"name": "Aspirin", "smiles": "CC(=O)OC1=CC=CC=C1C(=O)O", "description": "Pain reliever and anti-inflammatory"},
-        {"name": "Caffeine", "smiles": "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "description": "Central nervous system stimulant"},
-        {"name": "Ibuprofen", "smiles": "CC(C)CC1=CC=C(C=C1)C(C)C(=O)O", "description": "Nonsteroidal anti-inflammatory drug"},
-        {"name": "Ethanol", "smiles": "CCO", "description": "Simple alcohol, commonly used solvent"},
-        {"name": "Benzene", "smiles": "c1ccccc1", "description": "Aromatic hydrocarbon, basic benzene ring"},
-        {"name": "Glucose", "smiles": "C([C@@H]1[C@H]([C@@H]([C@H]([C@H](O1)O)O)O)O)O", "description": "Simple sugar, primary energy source"},
-        {"name": "Paracetamol", "smiles": "CC(=O)NC1=CC=C(C=C1)O", "description": "Acetaminophen, pain reliever"},
-        {"name": "Morphine", "smiles": "CN1CC[C@]23C4=C5C=CC(O)=C4O[C@H]2[C@@H](O)C=C[C@H]3[C@H]1C5", "description": "Opioid pain medication"}
-    ]
-    return render_template('examples.html', examples=examples)
+    return await render_template('examples.html', examples=_EXAMPLES)
 
 @app.route('/about')
-def about():
+async def about():
     """About page explaining the technology"""
-    return render_template('about.html')
+    return await render_template('about.html')
 
 if __name__ == '__main__':
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
     app.run(debug=True, host='0.0.0.0', port=3000) 
\ No newline at end of file
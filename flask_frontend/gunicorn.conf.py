@@ -0,0 +1,9 @@
+# Gunicorn settings for the Quart frontend (gunicorn -c gunicorn.conf.py wsgi:application)
+import multiprocessing
+
+bind = "0.0.0.0:3000"
+# Proxy routes await the backend on the event loop, so one async worker per core is enough
+workers = multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = 30
+timeout = 150  # above the longest backend timeout (batch parse, 120 s)
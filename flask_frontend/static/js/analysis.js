@@ -180,13 +180,20 @@ class AnalysisApp {
 
             // Step 2: Generate 3D conformer
             this.updateLoadingStep('loadingConformer', 'active');
-            const conformerResponse = await fetch('/api/conformer', {
+            // The /pdb route returns plain PDB text instead of a JSON envelope
+            const conformerResponse = await fetch('/api/conformer/pdb', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ smiles, forcefield: 'UFF' })
             });
 
-            const conformerData = await conformerResponse.json();
+            let conformerData;
+            if (conformerResponse.ok) {
+                conformerData = { pdb_block: await conformerResponse.text(), status: 'ok', forcefield_used: 'UFF' };
+            } else {
+                const error = await conformerResponse.json().catch(() => ({}));
+                conformerData = { error: error.detail || error.error || 'Failed to generate conformer' };
+            }
             this.updateLoadingStep('loadingConformer', 'completed');
 
             // Step 3: Full analysis (includes ADMET if available)
@@ -0,0 +1,4 @@
+"""ASGI entry point: gunicorn -c gunicorn.conf.py wsgi:application"""
+from app import app
+
+application = app